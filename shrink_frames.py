@@ -1,28 +1,100 @@
-from concurrent.futures import ProcessPoolExecutor
-import csv
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import hashlib
+from itertools import repeat
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
 import os
+import sys
 import cv2
+import numba
+from numba import njit, prange
 import numpy as np
+import pandas as pd
 
-def normalize_array(arr):
+def load_complexity_csv(csv_file):
     """
-    Normalize a NumPy array to the range [0, 1].
+    Load a block complexity CSV into a float32 NumPy array, caching it as .npy next to the CSV.
     
     Parameters:
-    arr (numpy.ndarray): Input array to be normalized.
+    csv_file (str): Path to the CSV file, with a header row and one column per frame.
     
     Returns:
-    numpy.ndarray: Normalized array with values in the range [0, 1].
+    numpy.ndarray: 2D array of shape (num_blocks, num_frames).
     """
-    arr_min = np.min(arr)
-    arr_max = np.max(arr)
-    normalized_arr = (arr - arr_min) / (arr_max - arr_min)
-    return normalized_arr
+    cache_file = csv_file + '.npy'
+    # Reuse the cache only if it is newer than the CSV it was built from
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(csv_file):
+        return np.load(cache_file)
+    arr = pd.read_csv(csv_file, header=0, dtype=np.float32).to_numpy()
+    np.save(cache_file, arr)
+    return arr
+
+@njit(cache=True)
+def select_lowest_k(row, k, out):
+    """
+    Find the indices of the k lowest values of a row, in no particular order.
+    
+    Parameters:
+    row (numpy.ndarray): 1D array of values.
+    k (int): Number of indices to select, at most len(row).
+    out (numpy.ndarray): 1D integer array of length k, filled in place with the selected indices.
+    """
+    if k == 0:
+        return
+    # out is kept as a max-heap of indices, ordered by their values in row
+    for i in range(row.shape[0]):
+        if i < k:
+            # push the index and sift it up
+            out[i] = i
+            child = i
+            while child > 0:
+                parent = (child - 1) // 2
+                if row[out[parent]] >= row[out[child]]:
+                    break
+                out[parent], out[child] = out[child], out[parent]
+                child = parent
+        elif row[i] < row[out[0]]:
+            # replace the largest selected value and sift it down
+            out[0] = i
+            parent = 0
+            while True:
+                largest = parent
+                left = 2 * parent + 1
+                right = left + 1
+                if left < k and row[out[left]] > row[out[largest]]:
+                    largest = left
+                if right < k and row[out[right]] > row[out[largest]]:
+                    largest = right
+                if largest == parent:
+                    break
+                out[parent], out[largest] = out[largest], out[parent]
+                parent = largest
+
+@njit(parallel=True, cache=True)
+def compute_coords(importance, k, out):
+    """
+    Find the indices of the k lowest values in every row of every frame, spreading frames across cores.
+    
+    Parameters:
+    importance (numpy.ndarray): Array of shape (num_frames, num_blocks_y, num_blocks_x).
+    k (int): Number of blocks to select per row.
+    out (numpy.ndarray): Integer array of shape (num_frames, num_blocks_y, k), filled in place.
+    """
+    num_frames, num_blocks_y, _ = importance.shape
+    for f in prange(num_frames):
+        for r in range(num_blocks_y):
+            select_lowest_k(importance[f, r], k, out[f, r])
 
 def get_coordinates_to_remove(temporal_file, spatial_file, width, height, square_size, alpha, percentage_to_remove):
+    # Reuse the mask of a previous run with the same complexity files and parameters
+    key = f'{alpha}_{percentage_to_remove}_{square_size}_{width}x{height}_{os.path.getmtime(temporal_file)}_{os.path.getmtime(spatial_file)}'
+    cache_file = f'{os.path.dirname(temporal_file)}/remove_mask_{hashlib.blake2b(key.encode()).hexdigest()[:16]}.npz'
+    if os.path.exists(cache_file):
+        return np.load(cache_file)['mask']
+
     # Load the CSV files into 2D NumPy arrays
-    temporal_array = np.loadtxt(temporal_file, delimiter=',', skiprows=1)
-    spatial_array = np.loadtxt(spatial_file, delimiter=',', skiprows=1)
+    temporal_array = load_complexity_csv(temporal_file)
+    spatial_array = load_complexity_csv(spatial_file)
 
     num_blocks_x = width // square_size  # Number of horizontal blocks
     num_blocks_y = height // square_size  # Number of vertical blocks
@@ -32,205 +104,251 @@ def get_coordinates_to_remove(temporal_file, spatial_file, width, height, square
     temporal_3d_array = temporal_array.T.reshape(num_frames, num_blocks_y, num_blocks_x)
     spatial_3d_array = spatial_array.T.reshape(num_frames, num_blocks_y, num_blocks_x)
 
-    # Normalize arrays
-    temporal_3d_array = normalize_array(temporal_3d_array)
-    spatial_3d_array = normalize_array(spatial_3d_array)
-
-    # Get the shape details
-    num_frames, num_blocks_y, num_blocks_x = spatial_3d_array.shape
-
-    # Initialize the importance array
-    importance = np.zeros((num_frames, num_blocks_y, num_blocks_x))
+    # Only the ranking within each row matters, and normalizing to [0, 1] shifts every value of a row by the same amount,
+    # so it is enough to divide each array by its range to weigh them equally
+    spatial_scale = alpha / np.ptp(spatial_3d_array)
+    temporal_scale = (1 - alpha) / np.ptp(temporal_3d_array)
 
     # Calculate the importance values (for the last frame, there is no successive temporal complexity, so we rely only on spatial)
-    for i in range(num_frames):
-        if i == num_frames - 1:
-            importance[i] = spatial_3d_array[i]
-        else:
-            importance[i] = alpha * spatial_3d_array[i] + (1 - alpha) * temporal_3d_array[i + 1]
-
-    # Initialize the list to store coordinates of the lowest values
-    lowest_values_coords = []
-
-    # Calculate the number of blocks to remove based on the percentage
-    percentage_to_remove = int(percentage_to_remove * num_blocks_x)
+    importance = np.multiply(spatial_3d_array, spatial_scale)
+    np.multiply(temporal_3d_array, temporal_scale, out=temporal_3d_array)
+    np.add(importance[:-1], temporal_3d_array[1:], out=importance[:-1])
+    importance[-1] = spatial_3d_array[-1]
 
-    # Loop through each frame
-    for i in range(num_frames):
-        frame_coords = []
-        # Loop through each row in the current frame
-        for j in range(num_blocks_y):
-            # Get the current row
-            current_row = importance[i, j, :]
+    # Calculate the number of blocks to remove based on the percentage (at most the whole row)
+    percentage_to_remove = min(int(percentage_to_remove * num_blocks_x), num_blocks_x)
 
-            # Find the indices of the lowest values in the current row based on the percentage
-            if len(current_row) > percentage_to_remove:
-                lowest_indices = np.argsort(current_row)[:percentage_to_remove]
-            else:
-                lowest_indices = np.argsort(current_row)
+    # Find the column indices of the lowest values in every row of every frame,
+    # giving an array of shape (num_frames, num_blocks_y, percentage_to_remove)
+    lowest_values_coords = np.empty((num_frames, num_blocks_y, percentage_to_remove), dtype=np.int32)
+    compute_coords(importance, percentage_to_remove, lowest_values_coords)
 
-            # Store the coordinates for column (frame and row given by indices)
-            row_coords = [k for k in lowest_indices]
-            frame_coords.append(row_coords)
+    # Turn the coordinates into a boolean mask of shape (num_frames, num_blocks_y, num_blocks_x), True where a block is removed
+    remove_mask = np.zeros((num_frames, num_blocks_y, num_blocks_x), dtype=bool)
+    np.put_along_axis(remove_mask, lowest_values_coords, True, axis=-1)
+    np.savez_compressed(cache_file, mask=remove_mask)
 
-        lowest_values_coords.append(frame_coords)
+    return remove_mask
 
-    return lowest_values_coords
+@njit(parallel=True, cache=True)
+def copy_kept_blocks(frame, remove_mask, l, out):
+    """
+    Copy the blocks of a frame that are not removed into out, packing them together row by row.
+    
+    Parameters:
+    frame (numpy.ndarray): Image with shape [n, m, c].
+    remove_mask (numpy.ndarray): Boolean array with shape [n//l, m//l], True for the blocks to be removed.
+    l (int): Side length of each block.
+    out (numpy.ndarray): Array with shape [n//l * l, new_num_cols * l, c], filled in place.
+    """
+    num_rows, num_cols = remove_mask.shape
+    for i in prange(num_rows):
+        k = 0
+        for j in range(num_cols):
+            if not remove_mask[i, j]:
+                out[i*l:(i+1)*l, k*l:(k+1)*l] = frame[i*l:(i+1)*l, j*l:(j+1)*l]
+                k += 1
 
-def split_image_into_squares(image: np.array, l: int) -> np.array:
+def shrink_frame(frame: np.array, remove_mask: np.array, l: int) -> np.array:
     """
-    Split an image into squares of a specific size.
+    Remove blocks from a frame and pack the remaining ones together, row by row.
 
     Args:
-    - image: numpy array representing the image with shape [n, m, c]
-    - l: integer representing the side length of each square
+    - frame: numpy array representing the image with shape [n, m, c]
+    - remove_mask: boolean array with shape [n//l, m//l], True for the blocks to be removed
+    - l: integer representing the side length of each block
 
     Returns:
-    - numpy array with shape [n//l, m//l, l, l, c] containing the squares
+    - numpy array with shape [n//l * l, new_num_cols * l, c] containing the kept blocks of each row
     """
-    n, m, c = image.shape
-    num_rows = n // l
-    num_cols = m // l
-    squares = np.zeros((num_rows, num_cols, l, l, c), dtype=image.dtype)
-    for i in range(num_rows):
-        for j in range(num_cols):
-            squares[i, j] = image[i*l:(i+1)*l, j*l:(j+1)*l, :]
-    return squares
+    num_rows, num_cols = remove_mask.shape
+    c = frame.shape[2]
+    # every row removes the same number of blocks
+    new_num_cols = num_cols - np.count_nonzero(remove_mask[0]) if num_rows else 0
+    # a new buffer for each frame, since the previous one may still be written to disk in the background
+    shrunk = np.empty((num_rows * l, new_num_cols * l, c), dtype=frame.dtype)
+    copy_kept_blocks(frame, remove_mask, l, shrunk)
+    return shrunk
 
-def filter_squares(squares: np.array, block_coords: list) -> tuple:
+def save_image(frame: np.array, output_folder: str, file_name: str) -> None:
+
+    # Create the output directory if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+    # save filtered frame, overwrite if it exists
+    if not cv2.imwrite(output_folder + '/' + file_name, frame, [int(cv2.IMWRITE_PNG_COMPRESSION), 0]):
+        raise OSError(f'Could not write {output_folder}/{file_name}')
+
+def init_worker():
+    """
+    Configure OpenCV and numba in a pool worker: frames are already processed in parallel across workers,
+    so their own threads would only oversubscribe the cores.
     """
-    Remove specified blocks from a squares array based on block coordinates.
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(1)
+    numba.set_num_threads(1)
 
-    Args:
-    - squares: numpy array with shape [num_rows, num_cols, l, l, c] representing the image split into squares
-    - block_coords: list of lists containing column indices of blocks to be removed for each row
+# Shared memory block and remove mask this worker is attached to (one scene at a time)
+mask_shm = None
+shared_remove_mask = None
 
+def attach_shared_remove_mask(shm_name, shape, dtype):
+    """
+    Attach a pool worker to the shared memory block holding the mask of blocks to remove.
+    Workers are reused across scenes, so the block is re-attached only when the parent shares a new one.
+    
+    Parameters:
+    shm_name (str): Name of the shared memory block created by the parent process.
+    shape (tuple): Shape of the remove mask.
+    dtype (numpy.dtype): Data type of the remove mask.
+    
     Returns:
-    - new_squares: numpy array with shape [num_rows, new_num_cols, l, l, c] containing squares without the removed blocks
-    - mask: list of length num_rows * num_cols indicating where blocks were removed (1) and unchanged areas (0)
+    numpy.ndarray: The remove mask, backed by the shared memory block.
     """
-    num_rows, num_cols, _, _, _ = squares.shape
-    new_squares = []
-    mask = []
-
-    for i in range(num_rows):
-        row_squares = []
-        for j in range(num_cols):
-            if j not in block_coords[i]:
-                row_squares.append(squares[i, j])
-                mask.append(0)
-            else:
-                mask.append(1)
-        new_squares.append(row_squares)
+    global mask_shm, shared_remove_mask
+    if mask_shm is None or mask_shm.name != shm_name:
+        # Release the block of the previous scene before attaching to the new one
+        if mask_shm is not None:
+            shared_remove_mask = None
+            mask_shm.close()
+        # Keep a reference to the shared memory block, otherwise its buffer is released
+        mask_shm = SharedMemory(name=shm_name)
+        shared_remove_mask = np.ndarray(shape, dtype=dtype, buffer=mask_shm.buf)
+    return shared_remove_mask
+
+def process_frame_server_side(frame_name, experiment_folder, square_size, mask_info):
 
-    # Convert new_squares list to numpy array
-    new_squares = np.array(new_squares)
+    resolution_folder, _ = experiment_folder.rsplit('/', 1)
+    frame_number = int(frame_name.split('.')[0])
+    remove_mask = attach_shared_remove_mask(*mask_info)[frame_number]
+    frame = np.ascontiguousarray(cv2.imread(f'{resolution_folder}/original/{frame_name}', cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION))
+    shrunk_flat = shrink_frame(frame, remove_mask, square_size)
+    # the parent collects the masks, packing them shrinks the returned bytes 8x
+    packed_mask = np.packbits(remove_mask.reshape(-1))
 
-    return new_squares, mask
+    return frame_name, packed_mask, shrunk_flat
 
-def flatten_squares_into_image(squares: np.array) -> np.array:
+def process_frames_server_side(frame_names, experiment_folder, square_size, mask_info, output_format='png'):
     """
-    Reconstruct the original image from split squares.
+    Shrink a chunk of frames in a pool worker, saving each PNG in a background thread while the next frame is processed.
 
     Args:
-    - squares: numpy array with shape [n, m, l, l, c] containing the split squares
+    - frame_names: list of the frame names in this chunk
+    - experiment_folder, square_size: experiment the frames belong to
+    - mask_info: name, shape and dtype of the shared memory block holding the remove mask
+    - output_format: 'png' saves the shrunk frames here, 'npz' returns them to the parent, which saves them in a single archive
 
     Returns:
-    - numpy array representing the reconstructed image
+    - list of (frame_name, packed_mask, shrunk_frame) tuples, shrunk_frame being None once saved as PNG
     """
-    n, m, l, _, c = squares.shape
-    num_rows = n * l
-    num_cols = m * l
-    image = np.zeros((num_rows, num_cols, c), dtype=squares.dtype)
-    for i in range(n):
-        for j in range(m):
-            image[i*l:(i+1)*l, j*l:(j+1)*l, :] = squares[i, j]
-    return image
-
-def save_image(frame: np.array, output_folder: str, file_name: str) -> None:
+    if output_format == 'npz':
+        return [process_frame_server_side(frame_name, experiment_folder, square_size, mask_info) for frame_name in frame_names]
 
-    # Create the output directory if it doesn't exist
-    os.makedirs(output_folder, exist_ok=True)
-    # save filtered frame, overwrite if it exists
-    cv2.imwrite(output_folder + '/' + file_name, frame, [int(cv2.IMWRITE_PNG_COMPRESSION), 0])
-
-def save_mask(frame_number, binary_representation, csv_file):
-    # Open the CSV file in append mode
-    with open(csv_file, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        # Write the frame number and binary representation as a new row
-        writer.writerow([frame_number] + binary_representation)
+    results = []
+    with ThreadPoolExecutor(max_workers=1) as io_executor:
+        pending_write = None
+        for frame_name in frame_names:
+            frame_name, packed_mask, shrunk_flat = process_frame_server_side(frame_name, experiment_folder, square_size, mask_info)
+            # wait for the previous write, so at most one frame is pending
+            if pending_write is not None:
+                pending_write.result()
+            # cv2.imwrite releases the GIL while encoding and writing
+            pending_write = io_executor.submit(save_image, shrunk_flat, f'{experiment_folder}/shrunk', frame_name)
+            results.append((frame_name, packed_mask, None))
+        # the chunk is done only once its last frame is on disk, raising any error of that write here
+        if pending_write is not None:
+            pending_write.result()
+
+    return results
+
+def shrink_scene(video_name, scene_number, resolution, square_size, percentage_to_remove, alpha, executor, output_format='png'):
+    """
+    Remove the least important blocks from every frame of a scene, saving shrunk frames and masks.
 
-def process_frame_server_side(frame_name, experiment_folder, square_size, block_coords):
+    Args:
+    - video_name, scene_number, resolution: identify the scene folder, e.g. videos/{video_name}/scene_{scene_number}/{resolution}
+    - square_size, percentage_to_remove, alpha: experiment parameters
+    - executor: ProcessPoolExecutor whose workers process the frames, reused across scenes
+    - output_format: 'png' writes one file per shrunk frame, 'npz' saves all shrunk frames in one compressed archive
 
-    resolution_folder, _ = experiment_folder.rsplit('/', 1)
-    frame = cv2.imread(f'{resolution_folder}/original/{frame_name}')
-    frame_squares = split_image_into_squares(frame, square_size)
-    shrunk_squares, mask = filter_squares(frame_squares, block_coords)
-    shrunk_flat = flatten_squares_into_image(shrunk_squares)
-    save_image(shrunk_flat, f'{experiment_folder}/shrunk', frame_name)
-    save_mask(frame_name, mask, f'{experiment_folder}/masks.csv')
-
-    return frame_name
-
-def sort_and_compress_masks(input_csv, output_compressed_npz):
-    # Read the CSV file and store the rows
-    rows = []
-    with open(input_csv, mode='r', newline='') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            frame_number = int(row[0].split('.')[0])  # Convert '0000.png' to int 0
-            binary_values = [int(val) for val in row[1:]]  # Convert binary values to int
-            rows.append([frame_number] + binary_values)
-    
-    # Convert to NumPy array with appropriate smaller data types
-    frame_numbers = np.array([row[0] for row in rows], dtype=np.uint16)
-    binary_data = np.array([row[1:] for row in rows], dtype=bool)
-    
-    # Combine frame numbers and binary data into a single structured array
-    structured_array = np.empty((len(rows),), dtype=[('frame', np.uint16), ('data', bool, binary_data.shape[1])])
-    structured_array['frame'] = frame_numbers
-    structured_array['data'] = binary_data
-    
-    # Sort the array based on the frame number
-    sorted_array = np.sort(structured_array, order='frame')
-    
-    # Save the sorted array to a compressed .npz file
-    np.savez_compressed(output_compressed_npz, sorted_data=sorted_array)
-
-# get parameters from orchestrator
-video_name = os.environ.get('video_name')
-scene_number = os.environ.get('scene_number')
-resolution = os.environ.get('resolution')
-width, height = resolution.split('x')
-width = int(width)
-height = int(height)
-square_size = int(os.environ.get('square_size'))
-percentage_to_remove = float(os.environ.get('percentage_to_remove'))
-alpha = float(os.environ.get('alpha'))
-resolution_folder = f'videos/{video_name}/scene_{scene_number}/{resolution}'
-experiment_folder = f'{resolution_folder}/squ_{square_size}_rem_{percentage_to_remove}_alp_{alpha}'
-frame_names = [frame_name for frame_name in os.listdir(f'{resolution_folder}/original') if frame_name.endswith('.png')]
-temporal_file = f'videos/{video_name}/scene_{scene_number}/{width}x{height}/complexity/reference_TC_blocks.csv'
-spatial_file = f'videos/{video_name}/scene_{scene_number}/{width}x{height}/complexity/reference_SC_blocks.csv'
-
-lowest_values_coords = get_coordinates_to_remove(temporal_file, spatial_file, width, height, square_size, alpha, percentage_to_remove)
-
-with ProcessPoolExecutor() as executor:
-    results = []
-    for frame_name in frame_names:
-        frame_number = int(frame_name.split('.')[0])
-        results.append(
-            executor.submit(
-                process_frame_server_side, 
-                frame_name, 
-                experiment_folder, 
-                square_size, 
-                lowest_values_coords[frame_number]
+    Returns:
+    - list of the processed frame names
+    """
+    width, height = resolution.split('x')
+    width = int(width)
+    height = int(height)
+    resolution_folder = f'videos/{video_name}/scene_{scene_number}/{resolution}'
+    experiment_folder = f'{resolution_folder}/squ_{square_size}_rem_{percentage_to_remove}_alp_{alpha}'
+    frame_names = [frame_name for frame_name in os.listdir(f'{resolution_folder}/original') if frame_name.endswith('.png')]
+    temporal_file = f'videos/{video_name}/scene_{scene_number}/{width}x{height}/complexity/reference_TC_blocks.csv'
+    spatial_file = f'videos/{video_name}/scene_{scene_number}/{width}x{height}/complexity/reference_SC_blocks.csv'
+
+    os.makedirs(experiment_folder, exist_ok=True)
+
+    remove_mask = get_coordinates_to_remove(temporal_file, spatial_file, width, height, square_size, alpha, percentage_to_remove)
+
+    # Share the remove mask with the workers once, instead of pickling it with every task
+    scene_shm = SharedMemory(create=True, size=max(remove_mask.nbytes, 1))
+    scene_remove_mask = np.ndarray(remove_mask.shape, dtype=remove_mask.dtype, buffer=scene_shm.buf)
+    scene_remove_mask[:] = remove_mask
+    mask_info = (scene_shm.name, remove_mask.shape, remove_mask.dtype)
+
+    # Send frames to the workers in chunks, so each task round-trip covers several frames
+    chunksize = max(1, len(frame_names) // (os.cpu_count() * 4))
+    frame_chunks = [frame_names[i:i + chunksize] for i in range(0, len(frame_names), chunksize)]
+    try:
+        results = [
+            result
+            for chunk_results in executor.map(
+                process_frames_server_side, 
+                frame_chunks, 
+                repeat(experiment_folder), 
+                repeat(square_size), 
+                repeat(mask_info), 
+                repeat(output_format)
             )
+            for result in chunk_results
+        ]
+    finally:
+        # Release the view before closing, then free the shared memory block
+        del scene_remove_mask
+        scene_shm.close()
+        scene_shm.unlink()
+
+    processed_frame_names = [frame_name for frame_name, _, _ in results]
+    if output_format == 'npz':
+        # save shrunk frames keyed by frame number, e.g. '0000'
+        np.savez_compressed(
+            f'{experiment_folder}/shrunk.npz', 
+            **{frame_name.split('.')[0]: shrunk_frame for frame_name, _, shrunk_frame in results}
         )
-    # Retrieve results
-    processed_frame_names = [future.result() for future in results]
 
-# order csv by frame number and convert into npz
-sort_and_compress_masks(f'{experiment_folder}/masks.csv', f'{experiment_folder}/masks.npz')
\ No newline at end of file
+    # gather the packed masks in frame order (row i is the mask of frame i) and save them once,
+    # with the number of blocks needed to unpack them
+    num_frames, num_blocks_y, num_blocks_x = remove_mask.shape
+    num_blocks = num_blocks_y * num_blocks_x
+    all_masks_packed = np.zeros((num_frames, (num_blocks + 7) // 8), dtype=np.uint8)
+    for frame_name, packed_mask, _ in results:
+        all_masks_packed[int(frame_name.split('.')[0])] = packed_mask
+    np.savez_compressed(f'{experiment_folder}/masks.npz', sorted_data=all_masks_packed, num_blocks=num_blocks)
+
+    return processed_frame_names
+
+if __name__ == '__main__':
+    # get parameters from orchestrator (scene_number may list several scenes, separated by spaces)
+    video_name = os.environ.get('video_name')
+    scene_numbers = os.environ.get('scene_number').split()
+    resolution = os.environ.get('resolution')
+    square_size = int(os.environ.get('square_size'))
+    percentage_to_remove = float(os.environ.get('percentage_to_remove'))
+    alpha = float(os.environ.get('alpha'))
+    # 'png' writes one file per shrunk frame, 'npz' saves all shrunk frames of the scene in one compressed archive
+    output_format = os.environ.get('output_format', 'png')
+
+    # Start workers from a fork server on Linux: forking this process directly is not safe
+    # once numba has started its parallel threads, while the server is a fresh process
+    mp_context = multiprocessing.get_context('forkserver') if sys.platform.startswith('linux') else None
+
+    # Start the workers once and reuse them for every scene
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_context, initializer=init_worker) as executor:
+        for scene_number in scene_numbers:
+            shrink_scene(video_name, scene_number, resolution, square_size, percentage_to_remove, alpha, executor, output_format)
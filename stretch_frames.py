@@ -1,25 +1,20 @@
 from concurrent.futures import ProcessPoolExecutor
-import csv
 import os
 import cv2
 import numpy as np
+import pandas as pd
 
 def decompress_and_save_as_csv(input_compressed_npz, output_csv):
-    # Load the compressed .npz file
+    # Load the compressed .npz file and unpack the bit-packed masks
     data = np.load(input_compressed_npz)
-    sorted_array = data['sorted_data']
+    sorted_array = np.unpackbits(data['sorted_data'], axis=1, count=int(data['num_blocks']))
     
-    # Convert frame numbers back to '0000.png' format
-    rows = []
-    for row in sorted_array:
-        frame_number = f'{row[0]:04}.png'
-        binary_values = [int(val) for val in row[1]]
-        rows.append([frame_number] + binary_values)
+    # Row i holds the mask of frame i, convert frame numbers back to '0000.png' format
+    df = pd.DataFrame(sorted_array)
+    df.insert(0, 'frame', [f'{i:04}.png' for i in range(len(sorted_array))])
     
     # Write the rows to the CSV file
-    with open(output_csv, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerows(rows)
+    df.to_csv(output_csv, header=False, index=False)
 
 def create_mask_from_binary(binary_representation, block_size, image_size):
     # invert the image width and height since that is how numpy interprets them 
@@ -42,18 +37,18 @@ def create_mask_from_binary(binary_representation, block_size, image_size):
 def convert_binary_to_masks(input_csv, output_folder, block_size, image_size):
     os.makedirs(output_folder, exist_ok=True)
 
-    with open(input_csv, 'r') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            frame_number = row[0].split('.')[0]  # Extract the frame number from '0000.png'
-            binary_representation = list(map(int, row[1:]))
-            
-            # Reconstruct the mask image
-            mask = create_mask_from_binary(binary_representation, block_size, image_size)
-            
-            # Save the reconstructed mask image
-            output_path = os.path.join(output_folder, f'{frame_number}.png')
-            cv2.imwrite(output_path, mask)
+    # Parse the whole CSV at once with the C tokenizer
+    df = pd.read_csv(input_csv, header=None, dtype={0: str})
+    frame_numbers = df.iloc[:, 0].str.split('.').str[0]  # Extract the frame number from '0000.png'
+    binary_data = df.iloc[:, 1:].to_numpy(dtype=bool)
+
+    for frame_number, binary_representation in zip(frame_numbers, binary_data):
+        # Reconstruct the mask image
+        mask = create_mask_from_binary(binary_representation, block_size, image_size)
+        
+        # Save the reconstructed mask image
+        output_path = os.path.join(output_folder, f'{frame_number}.png')
+        cv2.imwrite(output_path, mask)
 
 def split_image_into_squares(image: np.array, l: int) -> np.array:
     """